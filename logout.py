@@ -10,66 +10,263 @@ Requiere --execute para realizar acciones reales (por seguridad).
 Usar solo en sistemas donde tengas permiso.
 """
 
+# Solo módulos ligeros a nivel de módulo: el script se lanza desde un .desktop y el usuario
+# está esperando. subprocess, signal, json, hashlib, shutil y jeepney (opcional)
+# se importan dentro de las funciones que los usan, después de la comprobación de --execute.
 import os
 import sys
-import shutil
-import subprocess
-import getpass
+import pwd
 import time
+from functools import lru_cache, partial
+
+# binarios que consulta el script; se buscan todos en una sola pasada por $PATH
+KNOWN_BINS = frozenset((
+    "loginctl", "gnome-session-quit", "dm-tool", "pkexec",
+    "systemctl", "gdm", "gdm3", "sddm", "lightdm",
+))
+
+def _probe_bins(names):
+    """Recorre cada directorio de $PATH una vez y devuelve {nombre: ruta} de los ejecutables buscados."""
+    found = {}
+    for d in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        if not d:
+            continue
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.name in names and e.name not in found and not e.is_dir() and os.access(e.path, os.X_OK):
+                    found[e.name] = e.path
+    return found
+
+_BIN_CACHE = None
+
+def _bin_cache():
+    global _BIN_CACHE
+    if _BIN_CACHE is None:
+        _BIN_CACHE = _probe_bins(KNOWN_BINS)
+    return _BIN_CACHE
+
+# Caché entre ejecuciones (p.ej. varios doble-clic en el .desktop mientras se diagnostica):
+# binarios encontrados y último método que funcionó.
+PROBE_CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "logout_probe.json")
+
+def probe_cache_key():
+    """Huella del entorno; si cambia, la caché se descarta.
+
+    Incluye el mtime de cada directorio de $PATH para notar paquetes instalados/eliminados,
+    y KNOWN_BINS para que una versión del script que busque otros binarios no use una caché vieja.
+    """
+    path = os.environ.get("PATH", os.defpath)
+    mtimes = []
+    for d in path.split(os.pathsep):
+        try:
+            mtimes.append(os.stat(d).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    fingerprint = (path, tuple(mtimes), sorted(KNOWN_BINS),
+                   os.environ.get("XDG_SESSION_ID"), os.environ.get("XDG_CURRENT_DESKTOP"))
+    import hashlib
+    return hashlib.sha1(repr(fingerprint).encode()).hexdigest()
+
+def load_probe_cache(key):
+    """Devuelve el contenido de la caché si corresponde a `key`; si no, {}."""
+    global _BIN_CACHE
+    import json
+    try:
+        with open(PROBE_CACHE_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("key") != key:
+        return {}
+    if isinstance(data.get("bins"), dict) and _BIN_CACHE is None:
+        _BIN_CACHE = data["bins"]
+    return data
+
+def save_probe_cache(key, preferred=None):
+    import json
+    data = {"key": key, "bins": _bin_cache(), "preferred": preferred}
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE_FILE), exist_ok=True)
+        with open(PROBE_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    except OSError:
+        pass
 
+@lru_cache(maxsize=None)
 def cmd_exists(cmd):
+    if cmd in KNOWN_BINS:
+        return cmd in _bin_cache()
+    import shutil
     return shutil.which(cmd) is not None
 
-def run_cmd_list(cmd_list, capture_output=False):
+def run_cmd_list(cmd_list):
+    import subprocess
     try:
-        if capture_output:
-            proc = subprocess.run(cmd_list, capture_output=True, text=True)
-            return proc.returncode, proc.stdout.strip(), proc.stderr.strip()
-        else:
-            proc = subprocess.run(cmd_list)
-            return proc.returncode, "", ""
+        proc = subprocess.run(cmd_list)
+        return proc.returncode, "", ""
     except Exception as e:
         return 1, "", str(e)
 
-def run_shell(cmd, capture_output=False):
-    # fallback: run through shell (used only if needed)
+@lru_cache(maxsize=None)
+def _dbus_connection(bus):
+    """Conexión única al bus indicado ("SYSTEM" o "SESSION"), o None si jeepney/D-Bus no están disponibles."""
     try:
-        if capture_output:
-            proc = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            return proc.returncode, proc.stdout.strip(), proc.stderr.strip()
-        else:
-            proc = subprocess.run(cmd, shell=True)
-            return proc.returncode, "", ""
+        # opcional: hablar por D-Bus (logind, gnome-session) sin lanzar procesos
+        from jeepney.io.blocking import open_dbus_connection
+    except ImportError:
+        return None
+    try:
+        return open_dbus_connection(bus=bus)
+    except Exception:
+        return None
+
+def dbus_call(bus, path, bus_name, interface, method, signature=None, body=()):
+    """Llama a <interface>.<method> en el objeto indicado; devuelve el cuerpo de la respuesta.
+
+    Lanza RuntimeError si el bus no está disponible o si la respuesta es un error.
+    """
+    conn = _dbus_connection(bus)
+    if conn is None:
+        raise RuntimeError(f"D-Bus ({bus.lower()}) no disponible")
+    from jeepney import DBusAddress, MessageType, new_method_call
+    addr = DBusAddress(path, bus_name=bus_name, interface=interface)
+    reply = conn.send_and_get_reply(new_method_call(addr, method, signature, body), timeout=10)
+    if reply.header.message_type == MessageType.error:
+        raise RuntimeError(" ".join(str(b) for b in reply.body) or "error D-Bus")
+    return reply.body
+
+def login1_available():
+    return _dbus_connection("SYSTEM") is not None
+
+def login1_call(method, signature=None, body=()):
+    """Llama a org.freedesktop.login1.Manager.<method> en el bus del sistema."""
+    return dbus_call("SYSTEM", "/org/freedesktop/login1", "org.freedesktop.login1",
+                     "org.freedesktop.login1.Manager", method, signature, body)
+
+def run_login1(method, signature=None, body=()):
+    # misma convención (rc, stdout, stderr) que run_cmd_list
+    try:
+        login1_call(method, signature, body)
+        return 0, "", ""
+    except Exception as e:
+        return 1, "", str(e)
+
+def spawn(cmd_list):
+    """Lanza cmd_list con os.posix_spawnp y espera.
+
+    Misma convención (rc, stdout, stderr) que run_cmd_list.
+    Como subprocess (restore_signals=True), el hijo arranca con SIGPIPE y SIGXFSZ por defecto
+    en vez de heredar el "ignorar" que pone Python.
+    """
+    if not (hasattr(os, "posix_spawnp") and hasattr(os, "waitstatus_to_exitcode")):
+        return run_cmd_list(cmd_list)
+    import signal
+    try:
+        pid = os.posix_spawnp(cmd_list[0], cmd_list, os.environ,
+                              setsigdef=(signal.SIGPIPE, signal.SIGXFSZ))
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status), "", ""
+    except Exception as e:
+        return 1, "", str(e)
+
+def gnome_session_manager_available():
+    # ¿hay un org.gnome.SessionManager en el bus de sesión?
+    try:
+        has_owner, = dbus_call("SESSION", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                               "org.freedesktop.DBus", "NameHasOwner", "s", ("org.gnome.SessionManager",))
+        return bool(has_owner)
+    except Exception:
+        return False
+
+def run_gnome_logout():
+    # Lo mismo que `gnome-session-quit --logout --no-prompt`: Logout(1), 1 = sin confirmación
+    try:
+        dbus_call("SESSION", "/org/gnome/SessionManager", "org.gnome.SessionManager",
+                  "org.gnome.SessionManager", "Logout", "u", (1,))
+        return 0, "", ""
     except Exception as e:
         return 1, "", str(e)
 
+def run_method(runner):
+    """Ejecuta un método: lista argv (subproceso) o callable (p.ej. llamada D-Bus)."""
+    if callable(runner):
+        return runner()
+    return spawn(runner)
+
+def describe_runner(runner):
+    if callable(runner):
+        # métodos en proceso (D-Bus, /proc): nombre de la función y sus argumentos
+        func = getattr(runner, "func", runner)
+        args = getattr(runner, "args", ())
+        return "<" + " ".join([func.__name__] + [str(a) for a in args]) + ">"
+    return " ".join(runner)
+
+def method_key(runner):
+    """Clave hashable que identifica qué hace un método (para no ejecutar dos veces lo mismo)."""
+    if isinstance(runner, partial):
+        return (runner.func, runner.args)
+    if callable(runner):
+        return runner
+    return tuple(runner)
+
+def dedupe_methods(methods):
+    # conserva el orden; descarta métodos cuyo comando/llamada ya aparece antes
+    seen = set()
+    return [(r, d) for r, d in methods if not (method_key(r) in seen or seen.add(method_key(r)))]
+
 def get_current_user():
-    return getpass.getuser()
+    # mismo orden que getpass.getuser() sin importarlo: variables de entorno y luego pwd.
+    # Si el UID no tiene entrada en passwd (contenedores, caída de nss/sssd) se usa el UID;
+    # loginctl terminate-user acepta también un UID.
+    name = os.environ.get("LOGNAME") or os.environ.get("USER")
+    if name:
+        return name
+    try:
+        return pwd.getpwuid(os.getuid()).pw_name
+    except KeyError:
+        return str(os.getuid())
 
 def get_xdg_session_id():
     return os.environ.get("XDG_SESSION_ID") or os.environ.get("WAYLAND_DISPLAY")
 
 def find_session_for_uid(uid):
-    """Intenta encontrar sesión asociada al UID usando loginctl (si está disponible)."""
+    """Intenta encontrar sesión asociada al UID usando loginctl (si está disponible).
+
+    Una sola llamada a `loginctl list-sessions`: la salida ya incluye el UID de cada
+    sesión, así que no hace falta un `show-session` por cada una.
+    """
+    if login1_available():
+        try:
+            # ListSessions -> a(susso): (id, uid, user, seat, object path)
+            sessions, = login1_call("ListSessions")
+            return next((sid for sid, suid, *_ in sessions if suid == uid), None)
+        except Exception:
+            pass
     if not cmd_exists("loginctl"):
         return None
-    rc, out, err = run_shell("loginctl list-sessions --no-legend", capture_output=True)
-    if rc != 0 or not out:
+    # columnas SESSION UID USER SEAT ...; el formato texto existe en todas las versiones,
+    # así que basta un único proceso (no se prueba antes --output=json).
+    # Se lee la salida línea a línea y se corta en cuanto aparece el UID.
+    import subprocess
+    try:
+        proc = subprocess.Popen(["loginctl", "list-sessions", "--no-legend"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
         return None
-    for line in out.splitlines():
-        parts = line.split()
-        if not parts:
-            continue
-        session = parts[0]
-        rc2, out2, err2 = run_shell(f"loginctl show-session {session} -p User --no-pager", capture_output=True)
-        if rc2 != 0 or not out2:
-            continue
-        for l in out2.splitlines():
-            if l.startswith("User="):
-                val = l.split("=",1)[1].strip()
-                if val == str(uid):
-                    return session
-    return None
+    found = None
+    with proc:
+        for line in proc.stdout:
+            parts = line.split(None, 2)
+            if len(parts) >= 2 and parts[1] == str(uid):
+                found = parts[0]
+                proc.terminate()
+                break
+    return found
 
 def try_dm_tool_switch():
     # LightDM: dm-tool switch-to-greeter (no root)
@@ -79,34 +276,77 @@ def try_dm_tool_switch():
 
 def try_gnome_session_quit():
     # GNOME: gnome-session-quit --logout --no-prompt (tries to logout cleanly)
+    # Con D-Bus se llama a org.gnome.SessionManager.Logout directamente, sin lanzar gnome-session-quit
+    if gnome_session_manager_available():
+        return run_gnome_logout
     if cmd_exists("gnome-session-quit"):
         return ["gnome-session-quit", "--logout", "--no-prompt"]
     return None
 
 def try_loginctl_terminate_session(xdg_session):
     # loginctl terminate-session <id>  (may not require root if user owns session)
-    if cmd_exists("loginctl") and xdg_session:
+    # Con D-Bus se llama directamente a logind (Manager.TerminateSession) sin lanzar loginctl
+    if not xdg_session:
+        return None
+    if login1_available():
+        return partial(run_login1, "TerminateSession", "s", (str(xdg_session),))
+    if cmd_exists("loginctl"):
         return ["loginctl", "terminate-session", str(xdg_session)]
     return None
 
-def try_loginctl_found_session(uid):
-    if not cmd_exists("loginctl"):
+def try_loginctl_found_session(session):
+    # session: resultado de find_session_for_uid (main solo lo busca si no hay XDG_SESSION_ID)
+    if not session:
         return None
-    session = find_session_for_uid(uid)
-    if session:
-        return ["loginctl", "terminate-session", session]
-    return None
+    if login1_available():
+        return partial(run_login1, "TerminateSession", "s", (session,))
+    return ["loginctl", "terminate-session", session]
 
-def try_loginctl_terminate_user(user):
+def try_loginctl_terminate_user(user, uid):
     # more aggressive: terminate-user (kills all processes of user)
+    if login1_available():
+        return partial(run_login1, "TerminateUser", "u", (uid,))
     if cmd_exists("loginctl"):
         return ["loginctl", "terminate-user", user]
     return None
 
-def try_kill_user_pkill(user):
-    # very aggressive: pkill -KILL -u user
-    if cmd_exists("pkill"):
-        return ["pkill", "-KILL", "-u", user]
+def kill_user_processes(uid):
+    """Equivalente a `pkill -KILL -u <uid>` sin lanzar un proceso: recorre /proc y envía SIGKILL.
+
+    Compara el UID efectivo (2º campo de la línea Uid: de /proc/<pid>/status), igual que pkill -u.
+    Este mismo proceso se excluye.
+    """
+    import signal
+    me = os.getpid()
+    killed = 0
+    errors = 0
+    for d in os.listdir("/proc"):
+        if not d.isdigit() or int(d) == me:
+            continue
+        try:
+            with open(f"/proc/{d}/status") as f:
+                st = f.read()
+        except OSError:
+            continue
+        _, sep, rest = st.partition("\nUid:")
+        fields = rest.split(None, 2)
+        if not sep or len(fields) < 2 or fields[1] != str(uid):
+            continue
+        try:
+            os.kill(int(d), signal.SIGKILL)
+            killed += 1
+        except ProcessLookupError:
+            pass
+        except OSError:
+            errors += 1
+    if killed:
+        return 0, "", ""
+    return 1, "", "no se pudo matar ningún proceso" if errors else "no se encontraron procesos del usuario"
+
+def try_kill_user_pkill(uid):
+    # very aggressive: SIGKILL a todos los procesos del usuario (como pkill -KILL -u user)
+    if os.path.isdir("/proc"):
+        return partial(kill_user_processes, uid)
     return None
 
 def try_systemctl_restart_via_pkexec(dm_service):
@@ -116,18 +356,28 @@ def try_systemctl_restart_via_pkexec(dm_service):
         return ["pkexec", "systemctl", "restart", dm_service]
     return None
 
+DISPLAY_MANAGER_LINK = "/etc/systemd/system/display-manager.service"
+
 def best_guess_dm():
     # heurística simple para adivinar display manager / entorno
-    # Prioriza variables de entorno y existencia de binarios
+    # 1) systemd: display-manager.service es un enlace a la unidad real (p.ej. .../gdm3.service);
+    #    un solo readlink, sin buscar binarios
+    try:
+        unit = os.path.basename(os.readlink(DISPLAY_MANAGER_LINK))
+    except OSError:
+        unit = ""
+    if unit.endswith(".service"):
+        return unit[:-len(".service")]
+    # 2) variables de entorno
     env = os.environ.get("XDG_CURRENT_DESKTOP", "") + " " + os.environ.get("DESKTOP_SESSION", "") + " " + os.environ.get("XDG_SESSION_DESKTOP", "")
     env = env.lower()
-    if "gnome" in env or cmd_exists("gdm") or cmd_exists("gdm3"):
+    if "gnome" in env:
         return "gdm"
-    if "kde" in env or cmd_exists("sddm"):
+    if "kde" in env:
         return "sddm"
-    if "xfce" in env or cmd_exists("lightdm"):
+    if "xfce" in env:
         return "lightdm"
-    # fallback: check common binaries
+    # 3) fallback: check common binaries
     if cmd_exists("gdm") or cmd_exists("gdm3"):
         return "gdm"
     if cmd_exists("sddm"):
@@ -136,80 +386,69 @@ def best_guess_dm():
         return "lightdm"
     return None
 
-def attempt_method(cmd_list, description, capture_output=False, allow_wait=True):
-    print(f"[>] Intentando: {description} -> {' '.join(cmd_list)}")
-    rc, out, err = run_cmd_list(cmd_list, capture_output=capture_output)
+def attempt_method(runner, description, allow_wait=True):
+    # Sin capture_output: el comando hereda stdout/stderr y sus mensajes van directos a la terminal
+    # (no hace falta crear pipes para un proceso cuya sesión está a punto de terminar).
+    print(f"[>] Intentando: {description} -> {describe_runner(runner)}")
+    rc, out, err = run_method(runner)
     if rc == 0:
         print(f"[+] OK: {description}")
-        if capture_output:
-            if out:
-                print(out)
-            if err:
-                print("stderr:", err)
         # darle un pequeño tiempo para que el display manager responda antes de terminar el script
         if allow_wait:
             time.sleep(2)
         return True
     else:
         # algunos comandos, especialmente logout, devuelven rc != 0 aunque inicien proceso de logout.
-        # mostramos stderr para diagnóstico.
-        if capture_output:
-            print(f"[-] Falló (rc={rc}). stdout: {out} stderr: {err}")
+        # los métodos D-Bus (o un fallo al lanzar el comando) devuelven el error en `err`.
+        if err:
+            print(f"[-] Falló (rc={rc}). {err}")
         else:
             print(f"[-] Falló (rc={rc}).")
         return False
 
-def main():
-    if "--execute" not in sys.argv:
-        print("Por seguridad este script requiere --execute para realizar acciones reales.")
-        print("Ejemplo: python3 logout_to_greeter.py --execute")
-        sys.exit(1)
-
-    user = get_current_user()
-    uid = os.getuid()
-    xdg_session = get_xdg_session_id()
-    guessed_dm = best_guess_dm()
-
-    print(f"[i] Usuario detectado: {user} (uid {uid})")
-    if xdg_session:
-        print(f"[i] XDG_SESSION_ID / WAYLAND_DISPLAY detectado: {xdg_session}")
-    if guessed_dm:
-        print(f"[i] Display manager sugerido: {guessed_dm}")
-    else:
-        print("[i] No se pudo determinar claramente el display manager.")
-
+# Métodos que solo cierran la sesión actual. Solo estos pueden recordarse como "preferido"
+# en la caché y adelantarse en la lista: terminate-user, SIGKILL o reiniciar el DM no deben
+# saltarse a los métodos limpios en la siguiente ejecución.
+DESC_DM_TOOL = "dm-tool switch-to-greeter (LightDM greeter)"
+DESC_GNOME = "gnome-session-quit --logout --no-prompt (GNOME safe logout)"
+DESC_XDG_SESSION = "loginctl terminate-session <XDG_SESSION_ID> (systemd)"
+DESC_FOUND_SESSION = "loginctl terminate-session <session found by UID> (systemd)"
+PROMOTABLE_METHODS = frozenset((DESC_DM_TOOL, DESC_GNOME, DESC_XDG_SESSION, DESC_FOUND_SESSION))
+
+def build_methods(user, uid, xdg_session, found_session, guessed_dm):
+    """Devuelve la lista [(runner, descripción)] de métodos disponibles, de menos a más intrusivo."""
     # Lista de métodos por orden preferente
     methods = []
 
     # 1) dm-tool switch-to-greeter (LightDM) - no root
     m = try_dm_tool_switch()
     if m:
-        methods.append((m, "dm-tool switch-to-greeter (LightDM greeter)"))
+        methods.append((m, DESC_DM_TOOL))
 
     # 2) gnome-session-quit --logout --no-prompt (intento limpio para GNOME)
     m = try_gnome_session_quit()
     if m:
-        methods.append((m, "gnome-session-quit --logout --no-prompt (GNOME safe logout)"))
+        methods.append((m, DESC_GNOME))
 
     # 3) loginctl terminate-session XDG_SESSION_ID (systemd way) - suele funcionar en muchos DMs
     m = try_loginctl_terminate_session(xdg_session)
     if m:
-        methods.append((m, "loginctl terminate-session <XDG_SESSION_ID> (systemd)"))
+        methods.append((m, DESC_XDG_SESSION))
 
     # 4) loginctl terminate-session <found session by UID>
-    m = try_loginctl_found_session(uid)
+    m = try_loginctl_found_session(found_session)
     if m:
-        methods.append((m, "loginctl terminate-session <session found by UID> (systemd)"))
+        methods.append((m, DESC_FOUND_SESSION))
 
     # 5) loginctl terminate-user (agresivo)
-    m = try_loginctl_terminate_user(user)
+    m = try_loginctl_terminate_user(user, uid)
     if m:
         methods.append((m, "loginctl terminate-user <user> (kills all user processes)"))
 
-    # 6) pkill -KILL -u user (muy agresivo)
-    m = try_kill_user_pkill(user)
+    # 6) SIGKILL a todos los procesos del usuario, como pkill -KILL -u user (muy agresivo)
+    m = try_kill_user_pkill(uid)
     if m:
-        methods.append((m, "pkill -KILL -u <user> (muy drástico)"))
+        methods.append((m, "kill -KILL a los procesos de <user> via /proc (muy drástico)"))
 
     # 7) commandos para reiniciar el DM via pkexec (necesitarán auth GUI)
     # Solo añadimos el comando apropiado si conocemos el DM o si los binarios existen.
@@ -225,25 +464,66 @@ def main():
         if cmd:
             methods.append((cmd, f"pkexec systemctl restart {dm} (reinicia el display manager, requerirá autenticación)"))
 
+    return methods
+
+def execute_methods(methods, cache_key, preferred=None):
+    """Prueba los métodos en orden hasta que uno funcione; devuelve True si alguno tuvo éxito."""
+    methods = dedupe_methods(methods)
+    for runner, desc in methods:
+        ok = attempt_method(runner, desc)
+        if ok:
+            if desc != preferred and desc in PROMOTABLE_METHODS:
+                save_probe_cache(cache_key, desc)
+            return True
+        # esperar un poco antes de intentar el siguiente (evita spam)
+        time.sleep(1)
+    return False
+
+def main():
+    if "--execute" not in sys.argv:
+        print("Por seguridad este script requiere --execute para realizar acciones reales.")
+        print("Ejemplo: python3 logout_to_greeter.py --execute")
+        sys.exit(1)
+
+    cache_key = probe_cache_key()
+    cache = load_probe_cache(cache_key)
+
+    user = get_current_user()
+    uid = os.getuid()
+    xdg_session = get_xdg_session_id()
+    # Si ya tenemos XDG_SESSION_ID no hace falta buscar la sesión (ahorra llamadas a loginctl).
+    # Ojo: xdg_session puede ser WAYLAND_DISPLAY (p.ej. "wayland-0"), que no es un id de sesión.
+    found_session = find_session_for_uid(uid) if not os.environ.get("XDG_SESSION_ID") else None
+    guessed_dm = best_guess_dm()
+
+    print(f"[i] Usuario detectado: {user} (uid {uid})")
+    if xdg_session:
+        print(f"[i] XDG_SESSION_ID / WAYLAND_DISPLAY detectado: {xdg_session}")
+    if guessed_dm:
+        print(f"[i] Display manager sugerido: {guessed_dm}")
+    else:
+        print("[i] No se pudo determinar claramente el display manager.")
+
+    methods = build_methods(user, uid, xdg_session, found_session, guessed_dm)
+
     if not methods:
         print("[-] No se detectó ningún método disponible en este sistema para volver al greeter.")
-        print("    Comprobaciones realizadas: dm-tool, gnome-session-quit, loginctl, pkill, pkexec/systemctl.")
+        print("    Comprobaciones realizadas: dm-tool, gnome-session-quit, loginctl, /proc, pkexec/systemctl.")
         sys.exit(2)
 
-    # Ejecutar métodos en orden hasta que uno funcione
-    for cmd_list, desc in methods:
-        # métodos que no devuelven salida útil al captura a veces rompen; intentamos sin capture en primera instancia.
-        # Para los que sabemos pueden dar salida, usamos capture_output para diagnosticar.
-        capture = True if ("loginctl" in desc or "pkexec" in desc) else False
-        ok = attempt_method(cmd_list, desc, capture_output=capture)
-        # Si el método fue exitoso, salimos del script. Aunque el logout real normalmente terminará este proceso,
-        # en algunos entornos el proceso continúa y por eso hacemos sys.exit(0).
-        if ok:
-            print("[i] Si todo fue correcto, deberías ver ahora la pantalla de inicio de sesión (greeter).")
-            sys.exit(0)
-        else:
-            # esperar un poco antes de intentar el siguiente (evita spam)
-            time.sleep(1)
+    # Si una ejecución anterior tuvo éxito con algún método, probarlo primero.
+    preferred = cache.get("preferred")
+    if preferred in PROMOTABLE_METHODS:
+        methods.sort(key=lambda m: m[1] != preferred)
+    if not cache:
+        save_probe_cache(cache_key, preferred)
+
+    # Ejecutar métodos en orden hasta que uno funcione.
+    # Si el método fue exitoso, salimos del script. Aunque el logout real normalmente terminará este proceso,
+    # en algunos entornos el proceso continúa y por eso hacemos sys.exit(0).
+    if execute_methods(methods, cache_key, preferred):
+        print("[i] Si todo fue correcto, deberías ver ahora la pantalla de inicio de sesión (greeter).")
+        sys.exit(0)
 
     print("[-] Ningún método tuvo éxito. Revisa permisos, si hay autenticación necesaria o bloqueos por antivirus/VirtualBox.")
     print("Sugerencias:")